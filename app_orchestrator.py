@@ -1,9 +1,15 @@
+import hashlib
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from utils.config import validate_config
+from utils.idempotency import get_store
 from utils.openai_service import OpenAIService
 from utils.graph_service import GraphService
 
+# How long replayed idempotent responses stay valid
+IDEMPOTENCY_TTL_SECONDS = 86400
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -21,20 +27,33 @@ class EntraIDAgent:
             
         self.openai_service = OpenAIService()
         self.graph_service = GraphService()
+        self.idempotency_store = get_store()
         logger.info("EntraIDAgent initialized successfully")
-        
-    def process_command(self, command_text):
+
+    def process_command(self, command_text, idempotency_key=None):
         """
         Process a natural language command and execute it.
-        
+
         Args:
             command_text (str): The natural language command
-            
+            idempotency_key (str, optional): Client-supplied key; retries
+                carrying the same key and command replay the stored
+                response instead of re-executing side-effecting Graph calls
+
         Returns:
             dict: Response containing results and status
         """
         logger.info(f"Processing command: {command_text}")
-        
+
+        store_key = None
+        if idempotency_key:
+            command_hash = hashlib.sha256(command_text.encode()).hexdigest()
+            store_key = f"{idempotency_key}:{command_hash}"
+            cached = self.idempotency_store.get(store_key)
+            if cached is not None:
+                logger.info(f"Replaying stored response for idempotency key: {idempotency_key}")
+                return cached
+
         try:
             # Parse the command using OpenAI
             parsed_data = self.openai_service.parse_command(command_text)
@@ -45,39 +64,94 @@ class EntraIDAgent:
                 }
                 
             logger.info(f"Parsed command: {json.dumps(parsed_data, indent=2)}")
-            
-            # Execute the command based on the parsed action
-            if parsed_data['action'] == 'create_app_registration':
-                return self._create_app_registration(
-                    parsed_data['appName'],
-                    parsed_data.get('permissions', []),
-                    parsed_data.get('description', '')
-                )
-            elif parsed_data['action'] == 'update_app_registration':
-                # Implement update logic here
-                return {
-                    "success": False,
-                    "message": "Update app registration not implemented yet"
-                }
-            elif parsed_data['action'] == 'delete_app_registration':
-                # Implement delete logic here
-                return {
-                    "success": False,
-                    "message": "Delete app registration not implemented yet"
-                }
-            else:
-                return {
-                    "success": False,
-                    "message": f"Unknown action: {parsed_data['action']}"
-                }
-                
+
+            result = self._execute_parsed(parsed_data)
+
+            # Only successful outcomes are worth replaying; failures should
+            # be retried for real
+            if store_key and result.get('success', False):
+                self.idempotency_store.set(store_key, result, IDEMPOTENCY_TTL_SECONDS)
+
+            return result
+
         except Exception as e:
             logger.error(f"Error processing command: {str(e)}", exc_info=True)
             return {
                 "success": False,
                 "message": f"Error processing command: {str(e)}"
             }
-            
+
+    def process_commands(self, command_texts):
+        """
+        Process a batch of natural language commands in one parsing call.
+
+        All commands are parsed via a single OpenAI request and then
+        executed in order, so N commands pay one parsing round trip.
+
+        Args:
+            command_texts (list): The natural language commands, in order
+
+        Returns:
+            list: One response dict per input command
+        """
+        logger.info(f"Processing batch of {len(command_texts)} commands")
+
+        parsed_batch = self.openai_service.parse_commands(command_texts)
+
+        results = []
+        for command_text, parsed_data in zip(command_texts, parsed_batch):
+            if not parsed_data:
+                results.append({
+                    "success": False,
+                    "message": "Failed to parse command. Please try rephrasing."
+                })
+                continue
+
+            try:
+                results.append(self._execute_parsed(parsed_data))
+            except Exception as e:
+                logger.error(f"Error processing command: {str(e)}", exc_info=True)
+                results.append({
+                    "success": False,
+                    "message": f"Error processing command: {str(e)}"
+                })
+
+        return results
+
+    def _execute_parsed(self, parsed_data):
+        """
+        Execute a parsed command based on its action.
+
+        Args:
+            parsed_data (dict): Structured command data from the parser
+
+        Returns:
+            dict: Response containing results and status
+        """
+        if parsed_data['action'] == 'create_app_registration':
+            return self._create_app_registration(
+                parsed_data['appName'],
+                parsed_data.get('permissions', []),
+                parsed_data.get('description', '')
+            )
+        elif parsed_data['action'] == 'update_app_registration':
+            # Implement update logic here
+            return {
+                "success": False,
+                "message": "Update app registration not implemented yet"
+            }
+        elif parsed_data['action'] == 'delete_app_registration':
+            # Implement delete logic here
+            return {
+                "success": False,
+                "message": "Delete app registration not implemented yet"
+            }
+        else:
+            return {
+                "success": False,
+                "message": f"Unknown action: {parsed_data['action']}"
+            }
+
     def _create_app_registration(self, app_name, permissions=None, description=None):
         """
         Create an app registration with the specified details.
@@ -99,24 +173,38 @@ class EntraIDAgent:
             app_client_id = app['appId']
             
             logger.info(f"App registration created. ID: {app_id}, Client ID: {app_client_id}")
-            
-            # Create a client secret
-            secret_result = self.graph_service.create_client_secret(app_id)
+
+            # The client secret, permission grant and service principal only
+            # depend on the app registration, not on each other, so issue the
+            # three Graph calls concurrently. Wall-clock cost drops from the
+            # sum of the round trips to the slowest one.
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                secret_future = executor.submit(
+                    self.graph_service.create_client_secret, app_id
+                )
+
+                permissions_future = None
+                if permissions:
+                    logger.info(f"Adding permissions: {permissions}")
+                    permissions_future = executor.submit(
+                        self.graph_service.add_required_permissions, app_id, permissions
+                    )
+
+                logger.info("Creating service principal")
+                sp_future = executor.submit(
+                    self.graph_service.create_service_principal, app_client_id
+                )
+
+                secret_result = secret_future.result()
+                if permissions_future:
+                    permissions_future.result()
+                sp = sp_future.result()
+
             client_secret = secret_result['secretText']
             secret_id = secret_result['id']
-            
             logger.info(f"Client secret created. ID: {secret_id}")
-            
-            # Add required permissions
-            if permissions:
-                logger.info(f"Adding permissions: {permissions}")
-                self.graph_service.add_required_permissions(app_id, permissions)
-                
-            # Create service principal
-            logger.info("Creating service principal")
-            sp = self.graph_service.create_service_principal(app_client_id)
+
             sp_id = sp['id']
-            
             logger.info(f"Service principal created. ID: {sp_id}")
             
             # Return the results
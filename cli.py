@@ -1,40 +1,52 @@
 #!/usr/bin/env python3
 import sys
 import json
-import argparse
-from app_orchestrator import EntraIDAgent
+
+USAGE = """usage: cli.py [-h] [--json] command [command ...]
+
+Process natural language commands for Entra ID operations
+
+positional arguments:
+  command     Natural language command to process (e.g., 'Create an app
+              registration named MyApp')
+
+options:
+  -h, --help  show this help message and exit
+  --json      Output results in JSON format"""
 
 def main():
     """Command-line interface for the Entra ID Agent."""
-    
-    parser = argparse.ArgumentParser(
-        description="Process natural language commands for Entra ID operations"
-    )
-    parser.add_argument(
-        "command", 
-        nargs="+", 
-        help="Natural language command to process (e.g., 'Create an app registration named MyApp')"
-    )
-    parser.add_argument(
-        "--json", 
-        action="store_true",
-        help="Output results in JSON format"
-    )
-    
-    args = parser.parse_args()
-    
+
+    # Hand-rolled argument scan: the CLI only has --json and a positional
+    # command, so a single pass over sys.argv avoids importing argparse
+    # (and its transitive modules) on every invocation.
+    args = sys.argv[1:]
+
+    json_output = '--json' in args
+    if json_output:
+        args.remove('--json')
+
+    if args and args[0] in ('-h', '--help'):
+        print(USAGE)
+        sys.exit(0)
+
+    if not args:
+        print(USAGE, file=sys.stderr)
+        sys.exit(1)
+
     # Join the command arguments into a single string
-    command_text = " ".join(args.command)
-    
+    command_text = " ".join(args)
+
     try:
-        # Initialize the agent
+        # Initialize the agent (imported here so --help stays fast)
+        from app_orchestrator import EntraIDAgent
         agent = EntraIDAgent()
         
         # Process the command
         result = agent.process_command(command_text)
         
         # Output the result
-        if args.json:
+        if json_output:
             print(json.dumps(result, indent=2))
         else:
             if result.get('success', False):
@@ -1,7 +1,7 @@
-import json
 import logging
+import threading
+import orjson
 import azure.functions as func
-from app_orchestrator import EntraIDAgent
 
 # Create the function app
 app = func.FunctionApp(http_auth_level=func.AuthLevel.FUNCTION)
@@ -13,12 +13,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger('EntraIDAgentFunction')
 
-# Initialize the agent
-entra_agent = None
-try:
-    entra_agent = EntraIDAgent()
-except Exception as e:
-    logger.error(f"Failed to initialize agent: {str(e)}", exc_info=True)
+# The agent is constructed lazily on first request rather than at import
+# time: building it runs config validation and the Azure credential chain,
+# which would otherwise slow every cold start even for unrelated routes.
+_agent = None
+_agent_lock = threading.Lock()
+
+def get_agent():
+    """Return the shared EntraIDAgent, constructing it on first use."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                # Imported here so the (heavy) Azure/OpenAI dependency tree
+                # is only pulled in when a command actually needs the agent.
+                from app_orchestrator import EntraIDAgent
+                _agent = EntraIDAgent()
+    return _agent
 
 @app.route(route="process_command", methods=["POST"])
 def process_command(req: func.HttpRequest) -> func.HttpResponse:
@@ -32,40 +43,31 @@ def process_command(req: func.HttpRequest) -> func.HttpResponse:
         HttpResponse: Response containing results
     """
     logger.info("Processing incoming request")
-    
-    # Check if the agent was initialized successfully
-    if not entra_agent:
-        return func.HttpResponse(
-            json.dumps({
-                "success": False,
-                "message": "Agent not initialized. Check logs for details."
-            }),
-            status_code=500,
-            mimetype="application/json"
-        )
-    
+
     try:
         # Get the request body
         req_body = req.get_json()
-        
+
         # Extract the command from the request
         command = req_body.get('command')
         if not command:
             return func.HttpResponse(
-                json.dumps({
+                orjson.dumps({
                     "success": False,
                     "message": "No command provided. Please include a 'command' field in the request body."
                 }),
                 status_code=400,
                 mimetype="application/json"
             )
-            
-        # Process the command
-        result = entra_agent.process_command(command)
+
+        # Process the command; retries carrying an Idempotency-Key replay
+        # the stored response instead of re-creating resources
+        idempotency_key = req.headers.get('Idempotency-Key')
+        result = get_agent().process_command(command, idempotency_key=idempotency_key)
         
         # Return the result
         return func.HttpResponse(
-            json.dumps(result),
+            orjson.dumps(result),
             status_code=200 if result.get('success', False) else 400,
             mimetype="application/json"
         )
@@ -73,7 +75,63 @@ def process_command(req: func.HttpRequest) -> func.HttpResponse:
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
         return func.HttpResponse(
-            json.dumps({
+            orjson.dumps({
+                "success": False,
+                "message": f"Error processing request: {str(e)}"
+            }),
+            status_code=500,
+            mimetype="application/json"
+        )
+
+@app.route(route="process_commands", methods=["POST"])
+def process_commands(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Azure Function entry point to process a batch of commands.
+
+    All commands are parsed in a single OpenAI call, so scripted bulk
+    submissions pay one parsing round trip instead of one per command.
+
+    Args:
+        req: The HTTP request
+
+    Returns:
+        HttpResponse: Response containing one result per command
+    """
+    logger.info("Processing incoming batch request")
+
+    try:
+        # Get the request body
+        req_body = req.get_json()
+
+        # Extract the commands from the request
+        commands = req_body.get('commands')
+        if not commands or not isinstance(commands, list):
+            return func.HttpResponse(
+                orjson.dumps({
+                    "success": False,
+                    "message": "No commands provided. Please include a 'commands' list in the request body."
+                }),
+                status_code=400,
+                mimetype="application/json"
+            )
+
+        # Process the batch
+        results = get_agent().process_commands(commands)
+
+        all_succeeded = all(r.get('success', False) for r in results)
+        return func.HttpResponse(
+            orjson.dumps({
+                "success": all_succeeded,
+                "results": results
+            }),
+            status_code=200 if all_succeeded else 400,
+            mimetype="application/json"
+        )
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return func.HttpResponse(
+            orjson.dumps({
                 "success": False,
                 "message": f"Error processing request: {str(e)}"
             }),
@@ -1,7 +1,8 @@
-import json
 import logging
-from flask import Flask, request, jsonify
-from app_orchestrator import EntraIDAgent
+import threading
+import orjson
+from flask import Flask, Response, request
+from flask.json.provider import JSONProvider
 
 # Configure logging
 logging.basicConfig(
@@ -10,15 +11,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger('EntraIDLocalServer')
 
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson's C serializer."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Create Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+def _json_response(obj, status):
+    """Build a JSON response directly from orjson bytes, bypassing jsonify."""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+# The agent is constructed lazily on first request rather than at import
+# time, so importing this module (e.g. under a WSGI server) doesn't pay
+# for config validation and the Azure credential chain up front.
+_agent = None
+_agent_lock = threading.Lock()
 
-# Initialize the agent
-entra_agent = None
-try:
-    entra_agent = EntraIDAgent()
-except Exception as e:
-    logger.error(f"Failed to initialize agent: {str(e)}", exc_info=True)
+def get_agent():
+    """Return the shared EntraIDAgent, constructing it on first use."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                # Imported here so the (heavy) Azure/OpenAI dependency tree
+                # is only pulled in when a command actually needs the agent.
+                from app_orchestrator import EntraIDAgent
+                _agent = EntraIDAgent()
+    return _agent
 
 @app.route('/api/process-command', methods=['POST'])
 def process_command():
@@ -29,49 +55,87 @@ def process_command():
         Response: JSON response containing results
     """
     logger.info("Processing incoming request")
-    
-    # Check if the agent was initialized successfully
-    if not entra_agent:
-        return jsonify({
-            "success": False,
-            "message": "Agent not initialized. Check logs for details."
-        }), 500
-    
+
     try:
         # Get the request body
         req_body = request.json
-        
+
         # Extract the command from the request
         command = req_body.get('command')
         if not command:
-            return jsonify({
+            return _json_response({
                 "success": False,
                 "message": "No command provided. Please include a 'command' field in the request body."
-            }), 400
-            
-        # Process the command
-        result = entra_agent.process_command(command)
+            }, 400)
+
+        # Process the command; retries carrying an Idempotency-Key replay
+        # the stored response instead of re-creating resources
+        idempotency_key = request.headers.get('Idempotency-Key')
+        result = get_agent().process_command(command, idempotency_key=idempotency_key)
         
         # Return the result
-        return jsonify(result), 200 if result.get('success', False) else 400
+        return _json_response(result, 200 if result.get('success', False) else 400)
         
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
-        return jsonify({
+        return _json_response({
             "success": False,
             "message": f"Error processing request: {str(e)}"
-        }), 500
+        }, 500)
+
+@app.route('/api/process-commands', methods=['POST'])
+def process_commands():
+    """
+    Flask endpoint to process a batch of natural language commands.
+
+    All commands are parsed in a single OpenAI call, so scripted bulk
+    submissions pay one parsing round trip instead of one per command.
+
+    Returns:
+        Response: JSON response containing one result per command
+    """
+    logger.info("Processing incoming batch request")
+
+    try:
+        # Get the request body
+        req_body = request.json
+
+        # Extract the commands from the request
+        commands = req_body.get('commands')
+        if not commands or not isinstance(commands, list):
+            return _json_response({
+                "success": False,
+                "message": "No commands provided. Please include a 'commands' list in the request body."
+            }, 400)
+
+        # Process the batch
+        results = get_agent().process_commands(commands)
+
+        all_succeeded = all(r.get('success', False) for r in results)
+        return _json_response({
+            "success": all_succeeded,
+            "results": results
+        }, 200 if all_succeeded else 400)
+
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}", exc_info=True)
+        return _json_response({
+            "success": False,
+            "message": f"Error processing request: {str(e)}"
+        }, 500)
 
 if __name__ == '__main__':
-    # Display startup message
-    if entra_agent:
+    # Warm the agent eagerly when run as a standalone dev server so
+    # configuration problems surface at startup instead of on first request.
+    try:
+        get_agent()
         logger.info("EntraID Agent started successfully")
         print("\n✅ EntraID Agent started successfully")
         print("📡 API endpoint available at: http://localhost:5000/api/process-command")
         print("💡 Usage: Send POST requests with JSON body: {\"command\": \"your natural language command here\"}")
-    else:
-        logger.error("EntraID Agent failed to start. Check logs for details.")
+    except Exception as e:
+        logger.error(f"EntraID Agent failed to start: {str(e)}", exc_info=True)
         print("\n❌ EntraID Agent failed to start. Check logs for details.")
-    
+
     # Start the Flask app
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -1,8 +1,11 @@
 import os
 import sys
 from dotenv import load_dotenv
-from azure.identity import DefaultAzureCredential, ClientSecretCredential
-from azure.keyvault.secrets import SecretClient
+
+# The azure.identity / azure.keyvault imports are deferred into the
+# functions that need them: they pull in msal and cryptography (hundreds
+# of ms), and callers like validate_config or the CLI help path never
+# touch them.
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +25,8 @@ KEYVAULT_URL = os.getenv('AZURE_KEYVAULT_URL')
 
 def get_credentials():
     """Get Azure credentials for authenticating with Microsoft Graph API."""
+    from azure.identity import DefaultAzureCredential, ClientSecretCredential
+
     if all([TENANT_ID, CLIENT_ID, CLIENT_SECRET]):
         return ClientSecretCredential(
             tenant_id=TENANT_ID,
@@ -36,7 +41,9 @@ def get_secret_from_keyvault(secret_name):
     """Retrieve a secret from Azure Key Vault."""
     if not KEYVAULT_URL:
         return None
-    
+
+    from azure.keyvault.secrets import SecretClient
+
     try:
         credential = get_credentials()
         secret_client = SecretClient(vault_url=KEYVAULT_URL, credential=credential)
@@ -1,30 +1,140 @@
-import requests
+import os
+import httpx
+import ijson
+import orjson
 import json
+import threading
 import uuid
 from datetime import datetime, timedelta
 import time
 from . import config
 
+# Well-known application ID of the Microsoft Graph API itself
+GRAPH_API_APP_ID = "00000003-0000-0000-c000-000000000000"
+
+# Shared HTTP/2 client: all Graph calls multiplex over one TLS session,
+# so concurrent requests (e.g. the fan-out during app creation) don't
+# each pay a TCP+TLS handshake or hold their own connection.
+_client = httpx.Client(
+    transport=httpx.HTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=40)
+    ),
+    timeout=30.0
+)
+
+# Status codes worth retrying at the application level (httpx's transport
+# retries only cover connection failures). 5xx responses are only retried
+# for idempotent methods: a POST that died in flight may already have
+# created its app/secret/service principal, and re-sending it would
+# duplicate the resource. 429 is safe for every method since Graph
+# throttles before processing.
+_RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+_IDEMPOTENT_METHODS = {"GET", "PATCH", "DELETE"}
+_MAX_STATUS_RETRIES = 3
+
+# Disk cache for Graph's permission catalog (appRoles/oauth2PermissionScopes).
+# The catalog is identical across tenants for a given Graph release, so it is
+# persisted with its ETag and revalidated with If-None-Match on cold start.
+PERMISSIONS_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "entraid-agent", "graph_perms.json"
+)
+
+class _IterStream:
+    """Minimal file-like wrapper exposing read() over a byte iterator."""
+
+    def __init__(self, iterator):
+        self._iterator = iterator
+        self._buffer = b""
+
+    def read(self, size=-1):
+        if size < 0:
+            data = self._buffer + b"".join(self._iterator)
+            self._buffer = b""
+            return data
+        while len(self._buffer) < size:
+            try:
+                self._buffer += next(self._iterator)
+            except StopIteration:
+                break
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+# The two catalog arrays we keep from the servicePrincipals response
+_CATALOG_ARRAYS = ("appRoles", "oauth2PermissionScopes")
+
+def _parse_permission_catalog(stream):
+    """
+    Stream-parse the servicePrincipals catalog response with ijson.
+
+    Only the id and value of each appRole/oauth2PermissionScope are kept;
+    descriptions, display names and the rest of the ~50 KB payload are
+    discarded as they stream past instead of being materialized.
+
+    Args:
+        stream: File-like object yielding the raw JSON response body
+
+    Returns:
+        dict: {"appRoles": [...], "oauth2PermissionScopes": [...]} with
+            {"id", "value"} entries
+    """
+    catalog = {name: [] for name in _CATALOG_ARRAYS}
+    entry_prefixes = {f"value.item.{name}.item": name for name in _CATALOG_ARRAYS}
+
+    entry = None
+    entry_list = None
+    for prefix, event, value in ijson.parse(stream):
+        if event == "start_map" and prefix in entry_prefixes:
+            entry = {}
+            entry_list = catalog[entry_prefixes[prefix]]
+        elif entry is not None:
+            if event == "string":
+                if prefix.endswith(".id"):
+                    entry["id"] = value
+                elif prefix.endswith(".value"):
+                    entry["value"] = value
+            elif event == "end_map" and prefix in entry_prefixes:
+                entry_list.append(entry)
+                entry = None
+
+    return catalog
+
 class GraphService:
     def __init__(self):
         """Initialize the Microsoft Graph service with authentication."""
         self.credential = config.get_credentials()
         self.base_url = "https://graph.microsoft.com/v1.0"
         self.token = None
-        self.token_expires = None
+        self._token_expires_monotonic = 0.0
+        self._token_lock = threading.Lock()
+        # Shared request headers; the Authorization entry is rewritten only
+        # when the token refreshes, so no dict is rebuilt per call
+        self._headers = {"Content-Type": "application/json"}
+        self._graph_permissions = None
+        self._permission_index = None
     
     def _get_token(self):
         """Get an access token for Microsoft Graph API."""
-        if self.token and self.token_expires and datetime.now() < self.token_expires:
+        # Fast path: a monotonic float comparison, no datetime allocation
+        if self.token and time.monotonic() < self._token_expires_monotonic:
+            return self.token
+
+        # Serialize refreshes so concurrent callers don't each hit the
+        # credential endpoint when the token expires
+        with self._token_lock:
+            now = time.monotonic()
+            if self.token and now < self._token_expires_monotonic:
+                return self.token
+
+            # Get token for Microsoft Graph
+            token_response = self.credential.get_token("https://graph.microsoft.com/.default")
+            self.token = token_response.token
+            self._headers["Authorization"] = f"Bearer {self.token}"
+            # expires_on is absolute epoch seconds; keep a 5 minute safety margin
+            self._token_expires_monotonic = now + (token_response.expires_on - time.time()) - 300
+
             return self.token
-            
-        # Get token for Microsoft Graph
-        token_response = self.credential.get_token("https://graph.microsoft.com/.default")
-        self.token = token_response.token
-        # Set token expiry (subtract 5 minutes for safety margin)
-        self.token_expires = datetime.now() + timedelta(seconds=token_response.expires_on - 300)
-        
-        return self.token
         
     def _make_request(self, method, endpoint, data=None, params=None):
         """
@@ -40,34 +150,148 @@ class GraphService:
             dict: API response
         """
         url = f"{self.base_url}{endpoint}"
-        headers = {
-            "Authorization": f"Bearer {self._get_token()}",
-            "Content-Type": "application/json"
-        }
-        
+        # Refresh the token if needed; _headers carries the Authorization
+        self._get_token()
+
+        # Serialize the body with orjson (Content-Type is already set on
+        # the headers) rather than going through the client's json= path
+        content = orjson.dumps(data) if data is not None else None
+
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=data,
-                params=params
-            )
-            
+            # Retry throttled/transient statuses with backoff, honoring
+            # Retry-After; httpx's built-in retries only cover connects
+            for attempt in range(_MAX_STATUS_RETRIES + 1):
+                response = _client.request(
+                    method=method,
+                    url=url,
+                    headers=self._headers,
+                    content=content,
+                    params=params
+                )
+
+                retryable = (
+                    response.status_code in _RETRY_STATUS_CODES
+                    and (method.upper() in _IDEMPOTENT_METHODS
+                         or response.status_code == 429)
+                )
+                if not retryable or attempt == _MAX_STATUS_RETRIES:
+                    break
+
+                retry_after = response.headers.get("Retry-After")
+                if retry_after and retry_after.isdigit():
+                    delay = int(retry_after)
+                else:
+                    delay = 0.2 * (2 ** attempt)
+                time.sleep(delay)
+
             response.raise_for_status()
-            
+
             if response.status_code == 204:  # No content
                 return {}
-                
+
             return response.json()
-            
-        except requests.exceptions.RequestException as e:
+
+        except httpx.HTTPError as e:
             print(f"Error making Graph API request: {e}")
-            if hasattr(e, 'response') and e.response:
-                print(f"Response status: {e.response.status_code}")
-                print(f"Response text: {e.response.text}")
+            response = getattr(e, 'response', None)
+            if response is not None:
+                print(f"Response status: {response.status_code}")
+                print(f"Response text: {response.text}")
             raise
     
+    def _load_cached_permissions(self):
+        """Load the cached permission catalog from disk, or None."""
+        try:
+            with open(PERMISSIONS_CACHE_PATH) as f:
+                cached = json.load(f)
+            if isinstance(cached, dict) and "permissions" in cached:
+                return cached
+        except (OSError, json.JSONDecodeError):
+            pass
+        return None
+
+    def _save_cached_permissions(self, etag, permissions):
+        """Persist the permission catalog (with its ETag) to disk."""
+        try:
+            os.makedirs(os.path.dirname(PERMISSIONS_CACHE_PATH), exist_ok=True)
+            with open(PERMISSIONS_CACHE_PATH, "w") as f:
+                json.dump({"etag": etag, "permissions": permissions}, f)
+        except OSError as e:
+            # Cache is an optimization only; don't fail the operation
+            print(f"Warning: could not write permissions cache: {e}")
+
+    def _get_graph_permissions(self):
+        """
+        Get Microsoft Graph's permission catalog (appRoles and
+        oauth2PermissionScopes), cached in memory and on disk.
+
+        The ~50 KB service-principal lookup only changes when Microsoft
+        ships new Graph permissions, so the disk copy is revalidated with
+        If-None-Match instead of re-downloaded on every cold start.
+
+        Returns:
+            dict: The Graph service principal's permission fields
+        """
+        if self._graph_permissions is not None:
+            return self._graph_permissions
+
+        cached = self._load_cached_permissions()
+
+        url = (
+            f"{self.base_url}/servicePrincipals"
+            f"?$filter=appId eq '{GRAPH_API_APP_ID}'"
+            "&$select=appRoles,oauth2PermissionScopes"
+        )
+        self._get_token()
+        headers = self._headers
+        if cached and cached.get("etag"):
+            # Copy so the conditional header doesn't leak into other calls
+            headers = {**headers, "If-None-Match": cached["etag"]}
+
+        try:
+            with _client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    self._graph_permissions = cached["permissions"]
+                    return self._graph_permissions
+
+                response.raise_for_status()
+                # Parse the (transparently decompressed) body as it
+                # streams in
+                permissions = _parse_permission_catalog(
+                    _IterStream(response.iter_bytes())
+                )
+                etag = response.headers.get("ETag")
+
+        except httpx.HTTPError as e:
+            if cached:
+                # Fall back to the disk copy rather than failing outright
+                print(f"Warning: permission catalog refresh failed, using cached copy: {e}")
+                self._graph_permissions = cached["permissions"]
+                return self._graph_permissions
+            raise
+
+        self._save_cached_permissions(etag, permissions)
+        self._graph_permissions = permissions
+        return permissions
+
+    def _get_permission_index(self):
+        """
+        Get the Graph permission catalog indexed by permission value.
+
+        Built once per instance so permission resolution is a dict lookup
+        instead of a linear scan over ~500 catalog entries.
+
+        Returns:
+            tuple: (app_roles_by_value, delegated_scopes_by_value) dicts
+        """
+        if self._permission_index is None:
+            catalog = self._get_graph_permissions()
+            self._permission_index = (
+                {role["value"]: role for role in catalog.get("appRoles", [])},
+                {scope["value"]: scope for scope in catalog.get("oauth2PermissionScopes", [])}
+            )
+        return self._permission_index
+
     def create_app_registration(self, app_name, description=None):
         """
         Create a new app registration in Entra ID.
@@ -141,21 +365,17 @@ class GraphService:
         
         # Map of common Microsoft APIs to their IDs
         api_map = {
-            "Microsoft Graph": "00000003-0000-0000-c000-000000000000",
+            "Microsoft Graph": GRAPH_API_APP_ID,
             "SharePoint": "00000003-0000-0ff1-ce00-000000000000",
             "Exchange": "00000002-0000-0ff1-ce00-000000000000"
         }
-        
+
         # For each permission, add it to the requiredResourceAccess field
         # Here we're assuming most permissions are for Microsoft Graph
         graph_api_id = api_map["Microsoft Graph"]
-        
-        # Get the service principal to find permission IDs
-        # Note: In a production app, you might want to cache this
-        graph_permissions = self._make_request(
-            "GET", 
-            f"/servicePrincipals?$filter=appId eq '{graph_api_id}'&$select=appRoles,oauth2PermissionScopes"
-        )["value"][0]
+
+        # Permission IDs come from the cached, value-indexed Graph catalog
+        app_roles_by_value, delegated_scopes_by_value = self._get_permission_index()
         
         # Build the requiredResourceAccess object
         required_access = app.get("requiredResourceAccess", [])
@@ -167,41 +387,28 @@ class GraphService:
         if graph_access not in required_access:
             required_access.append(graph_access)
         
-        # For each permission, find its ID and add it to the access object
+        # IDs already granted, so the duplicate check below is O(1)
+        granted_ids = {ra["id"] for ra in graph_access["resourceAccess"]}
+
+        # Resolve each permission with a dict lookup. Application (appRole)
+        # entries win when a value exists in both forms (e.g. Sites.Read.All
+        # is both delegated and application), matching the previous default.
         for permission in permissions:
-            # Determine if this is a delegated or application permission
-            # Application permissions are in appRoles
-            # Delegated permissions are in oauth2PermissionScopes
-            permission_type = "Application"  # Default to Application permission
-            if "." in permission:
-                scope_parts = permission.split(".")
-                if scope_parts[-1] == "All":
-                    permission_type = "Application"
-                else:
-                    permission_type = "Delegated"
-            
-            # Find the permission ID
-            if permission_type == "Application":
-                permission_def = next(
-                    (p for p in graph_permissions.get("appRoles", []) if p["value"] == permission),
-                    None
-                )
+            permission_def = app_roles_by_value.get(permission)
+            if permission_def is not None:
+                permission_type_value = "Role"
             else:
-                permission_def = next(
-                    (p for p in graph_permissions.get("oauth2PermissionScopes", []) if p["value"] == permission),
-                    None
-                )
-                
-            if not permission_def:
+                permission_def = delegated_scopes_by_value.get(permission)
+                permission_type_value = "Scope"
+
+            if permission_def is None:
                 print(f"Warning: Permission {permission} not found")
                 continue
-                
+
             # Add the permission if it's not already there
             permission_id = permission_def["id"]
-            permission_type_value = "Role" if permission_type == "Application" else "Scope"
-            
-            # Check if the permission is already in the list
-            if not any(ra["id"] == permission_id for ra in graph_access["resourceAccess"]):
+            if permission_id not in granted_ids:
+                granted_ids.add(permission_id)
                 graph_access["resourceAccess"].append({
                     "id": permission_id,
                     "type": permission_type_value
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+
+import orjson
+
+# Default location for the SQLite-backed store, alongside the Graph
+# permission cache
+DEFAULT_DB_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "entraid-agent", "idempotency.db"
+)
+
+class IdempotencyStore:
+    """Interface for caching responses keyed on an idempotency key."""
+
+    def get(self, key):
+        """
+        Look up a previously stored response.
+
+        Args:
+            key (str): The idempotency cache key
+
+        Returns:
+            dict: The stored response, or None on miss/expiry
+        """
+        raise NotImplementedError
+
+    def set(self, key, response, ttl):
+        """
+        Store a response for later replay.
+
+        Args:
+            key (str): The idempotency cache key
+            response (dict): The response to store
+            ttl (int): Time to live in seconds
+        """
+        raise NotImplementedError
+
+class SqliteStore(IdempotencyStore):
+    """File-backed store using SQLite, suitable for a single host."""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        """Open (creating if needed) the SQLite database at db_path."""
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # One shared connection; sqlite3 serializes statements but not
+        # multi-step operations, so guard them with a lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, expires_at = row
+        if expires_at < time.time():
+            with self._lock:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+            return None
+        return orjson.loads(response)
+
+    def set(self, key, response, ttl):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, expires_at) "
+                "VALUES (?, ?, ?)",
+                (key, orjson.dumps(response).decode(), time.time() + ttl)
+            )
+            self._conn.commit()
+
+class RedisStore(IdempotencyStore):
+    """Redis-backed store for multi-worker / multi-host deployments."""
+
+    def __init__(self, url):
+        """Connect to the Redis instance at url."""
+        # Imported here so redis stays an optional dependency
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        stored = self._client.get(f"entraid-idem:{key}")
+        if stored is None:
+            return None
+        return orjson.loads(stored)
+
+    def set(self, key, response, ttl):
+        self._client.set(f"entraid-idem:{key}", orjson.dumps(response), ex=ttl)
+
+def get_store():
+    """Build the configured store: Redis if REDIS_URL is set, else SQLite."""
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        return RedisStore(redis_url)
+    return SqliteStore()
@@ -1,8 +1,81 @@
 import json
+import hashlib
+import textwrap
+import threading
+import time
+from collections import OrderedDict
+
 import openai
 from . import config
 
+# L1 exact-match response cache. Keyed on a hash of the deployment, system
+# prompt and command text; repeated commands skip the Azure OpenAI round trip
+# entirely. Entries are (timestamp, parsed_dict) tuples evicted LRU-style.
+_PARSE_CACHE = OrderedDict()
+_PARSE_CACHE_MAX_ENTRIES = 1024
+_PARSE_CACHE_TTL_SECONDS = 600
+# Guards expiry/move_to_end/eviction, which aren't atomic and are hit
+# concurrently under the threaded Flask server and the batch route
+_PARSE_CACHE_LOCK = threading.Lock()
+
+def _extract_json_object(text):
+    """
+    Return the first top-level JSON object in text, found in one pass.
+
+    Walks the string once tracking brace depth, ignoring braces inside
+    string literals so values like {"description": "a {thing}"} don't
+    skew the count.
+
+    Args:
+        text (str): Model output that may wrap JSON in prose or fences
+
+    Returns:
+        str: The slice from the first '{' to its matching '}', or None
+    """
+    start = None
+    depth = 0
+    in_string = False
+    escaped = False
+
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            if start is None:
+                start = index
+            depth += 1
+        elif char == '}' and start is not None:
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+
+    return None
+
 class OpenAIService:
+    # System message that instructs the model how to parse commands.
+    # Dedented and stripped once at import so every request sends the same
+    # byte-identical prefix — a prerequisite for server-side prompt caching.
+    SYSTEM_PROMPT = textwrap.dedent("""
+    You are an AI assistant specialized in parsing natural language commands related to Microsoft Entra ID (formerly Azure AD) operations.
+    Your task is to extract structured information from the user's command.
+
+    For app registration commands, extract the following information:
+    - action: The specific action (e.g., create_app_registration, update_app_registration, delete_app_registration)
+    - appName: The name of the app registration
+    - permissions: List of required API permissions (e.g., ["Sites.Read.All", "User.Read"])
+    - description: Purpose of the app registration
+
+    Return the extracted information as valid JSON with these fields only when relevant.
+    If you cannot confidently extract a piece of information, leave that field empty.
+    """).strip()
+
     def __init__(self):
         """Initialize the OpenAI service with Azure OpenAI configurations."""
         openai.api_type = "azure"
@@ -11,72 +84,219 @@ class OpenAIService:
         openai.api_version = "2023-05-15"  # Update this to the version you're using
         self.deployment_name = config.OPENAI_DEPLOYMENT
 
+        # The deployment name and system prompt are static for the lifetime
+        # of the service, so hash that prefix once and only feed the
+        # per-call command text into a copy of the digest.
+        self._key_prefix_hash = hashlib.sha256(
+            f"{self.deployment_name}|{self.SYSTEM_PROMPT}|".encode()
+        )
+
+    def _cache_key(self, command_text):
+        """Build the cache key for a command (deployment + prompt + text)."""
+        digest = self._key_prefix_hash.copy()
+        digest.update(command_text.encode())
+        return digest.hexdigest()
+
+    def _cache_get(self, key):
+        """Return a cached parse result, or None on miss/expiry."""
+        with _PARSE_CACHE_LOCK:
+            entry = _PARSE_CACHE.get(key)
+            if entry is None:
+                return None
+            timestamp, value = entry
+            if time.time() - timestamp > _PARSE_CACHE_TTL_SECONDS:
+                del _PARSE_CACHE[key]
+                return None
+            # Mark as recently used
+            _PARSE_CACHE.move_to_end(key)
+            return value
+
+    def _cache_set(self, key, value):
+        """Store a parse result, evicting the least recently used entry."""
+        with _PARSE_CACHE_LOCK:
+            _PARSE_CACHE[key] = (time.time(), value)
+            _PARSE_CACHE.move_to_end(key)
+            while len(_PARSE_CACHE) > _PARSE_CACHE_MAX_ENTRIES:
+                _PARSE_CACHE.popitem(last=False)
+
     def parse_command(self, command_text):
         """
         Parse a natural language command into structured data using Azure OpenAI.
-        
+
         Args:
             command_text (str): The natural language command
-            
+
         Returns:
             dict: Structured data extracted from the command
         """
-        try:
-            # Create a system message that instructs the model how to parse commands
-            system_prompt = """
-            You are an AI assistant specialized in parsing natural language commands related to Microsoft Entra ID (formerly Azure AD) operations.
-            Your task is to extract structured information from the user's command.
-            
-            For app registration commands, extract the following information:
-            - action: The specific action (e.g., create_app_registration, update_app_registration, delete_app_registration)
-            - appName: The name of the app registration
-            - permissions: List of required API permissions (e.g., ["Sites.Read.All", "User.Read"])
-            - description: Purpose of the app registration
-            
-            Return the extracted information as valid JSON with these fields only when relevant.
-            If you cannot confidently extract a piece of information, leave that field empty.
-            """
+        # Check the exact-match cache first: identical commands short-circuit
+        # to a dict lookup instead of a multi-second API round trip.
+        cache_key = self._cache_key(command_text)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
 
+        try:
             response = openai.ChatCompletion.create(
                 engine=self.deployment_name,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
                     {"role": "user", "content": command_text}
                 ],
                 temperature=0.0,  # Use low temperature for deterministic results
                 max_tokens=800,
                 n=1,
-                stop=None
+                stop=None,
+                stream=True
             )
-            
-            parsed_response = response.choices[0].message.content.strip()
+
+            # Accumulate streamed deltas while running the same
+            # string-aware brace tracking as _extract_json_object
+            # incrementally across chunks, so we can disconnect as soon as
+            # the JSON object closes instead of waiting out any trailing
+            # tokens the model emits. Braces inside string values (e.g. an
+            # appName containing '}') must not close the stream early.
+            chunks = []
+            depth = 0
+            in_string = False
+            escaped = False
+            in_object = False
+            closed = False
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.get('content')
+                if not content:
+                    continue
+                chunks.append(content)
+                for char in content:
+                    if in_string:
+                        if escaped:
+                            escaped = False
+                        elif char == '\\':
+                            escaped = True
+                        elif char == '"':
+                            in_string = False
+                    elif char == '"':
+                        in_string = True
+                    elif char == '{':
+                        depth += 1
+                        in_object = True
+                    elif char == '}' and in_object:
+                        depth -= 1
+                        if depth == 0:
+                            closed = True
+                            break
+                if closed:
+                    response.close()
+                    break
+
+            parsed_response = ''.join(chunks).strip()
             
             # Try to extract valid JSON from the response
             try:
-                # Find JSON in the response if it's wrapped in text or code blocks
-                json_start = parsed_response.find('{')
-                json_end = parsed_response.rfind('}') + 1
-                
-                if json_start >= 0 and json_end > json_start:
-                    json_str = parsed_response[json_start:json_end]
-                    parsed_data = json.loads(json_str)
-                else:
-                    # Try parsing the whole response as JSON
-                    parsed_data = json.loads(parsed_response)
-                
-                # Validate the parsed data
-                if self._validate_parsed_data(parsed_data):
-                    return parsed_data
-                else:
-                    raise ValueError("Parsed data is missing required fields")
-                    
+                # Common case: the model returned pure JSON
+                parsed_data = json.loads(parsed_response)
             except json.JSONDecodeError:
-                raise ValueError(f"Failed to decode JSON from response: {parsed_response}")
+                # Otherwise pull the first top-level object out of the
+                # surrounding text or code fences in a single pass
+                json_str = _extract_json_object(parsed_response)
+                if json_str is None:
+                    raise ValueError(f"Failed to decode JSON from response: {parsed_response}")
+                try:
+                    parsed_data = json.loads(json_str)
+                except json.JSONDecodeError:
+                    raise ValueError(f"Failed to decode JSON from response: {parsed_response}")
+
+            # Validate the parsed data
+            if self._validate_parsed_data(parsed_data):
+                self._cache_set(cache_key, parsed_data)
+                return parsed_data
+            else:
+                raise ValueError("Parsed data is missing required fields")
                 
         except Exception as e:
             print(f"Error parsing command: {e}")
             return None
     
+    def parse_commands(self, command_texts):
+        """
+        Parse multiple natural language commands in a single API call.
+
+        All commands are numbered into one user message and the model is
+        asked for a JSON array, so N commands cost one network round trip
+        instead of N. Commands already in the exact-match cache are served
+        from it and excluded from the batched request.
+
+        Args:
+            command_texts (list): The natural language commands, in order
+
+        Returns:
+            list: One dict (or None on parse failure) per input command
+        """
+        results = [None] * len(command_texts)
+
+        # Serve cache hits up front; only send the misses to the API.
+        cache_keys = [self._cache_key(text) for text in command_texts]
+        pending = []
+        for index, key in enumerate(cache_keys):
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+
+        if not pending:
+            return results
+
+        try:
+            numbered = "\n".join(
+                f"{position}. {command_texts[index]}"
+                for position, index in enumerate(pending, start=1)
+            )
+            user_message = (
+                "Parse each of the following commands and return a JSON array "
+                "of objects in order, one object per command:\n" + numbered
+            )
+
+            response = openai.ChatCompletion.create(
+                engine=self.deployment_name,
+                messages=[
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=0.0,  # Use low temperature for deterministic results
+                max_tokens=800 * len(pending),
+                n=1,
+                stop=None
+            )
+
+            parsed_response = response.choices[0].message.content.strip()
+
+            # Find the JSON array in the response if it's wrapped in text
+            json_start = parsed_response.find('[')
+            json_end = parsed_response.rfind(']') + 1
+
+            if json_start >= 0 and json_end > json_start:
+                parsed_list = json.loads(parsed_response[json_start:json_end])
+            else:
+                parsed_list = json.loads(parsed_response)
+
+            if not isinstance(parsed_list, list):
+                raise ValueError("Expected a JSON array of parsed commands")
+
+            for index, parsed_data in zip(pending, parsed_list):
+                if self._validate_parsed_data(parsed_data):
+                    self._cache_set(cache_keys[index], parsed_data)
+                    results[index] = parsed_data
+
+        except json.JSONDecodeError:
+            print(f"Error parsing commands: failed to decode JSON from response")
+        except Exception as e:
+            print(f"Error parsing commands: {e}")
+
+        return results
+
     def _validate_parsed_data(self, data):
         """
         Validate that the parsed data contains the necessary fields based on the action.